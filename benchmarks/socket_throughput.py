@@ -0,0 +1,149 @@
+"""
+Throughput benchmark: legacy thread-per-connection socket proxy vs the asyncio framed server.
+
+The insights pipeline is replaced by a stub on both sides so the numbers measure transport
+overhead only (the legacy path still pays its loopback HTTP hop to a FastAPI app).
+
+    python benchmarks/socket_throughput.py --clients 8 --requests 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stock  # noqa: E402
+
+LEGACY_SOCKET_PORT = 9080
+LEGACY_HTTP_PORT = 9000
+ASYNC_SOCKET_PORT = 9081
+
+PAYLOAD = {
+    "symbol": "AAPL",
+    "news_query": "Apple",
+    "alpha_vantage_key": "x",
+    "news_api_key": "x",
+    "fred_api_key": "x",
+    "gemini_api_key": "x",
+}
+
+
+def stub_insights(query):
+    return {"basic_insights": {"symbol": query.symbol, "recommendation": "Buy"}, "advanced_insights": "stub"}
+
+
+# Legacy implementation, reproduced from the previous version of stock.py
+stub_app = FastAPI()
+
+
+@stub_app.post("/insights/")
+def stub_endpoint(query: stock.StockQuery):
+    return stub_insights(query)
+
+
+def legacy_handle_client(client_socket):
+    try:
+        data = client_socket.recv(4096).decode("utf-8")
+        if not data:
+            return
+        request_data = json.loads(data)
+        response = requests.post(f"http://127.0.0.1:{LEGACY_HTTP_PORT}/insights/", json=request_data)
+        client_socket.sendall(response.text.encode("utf-8"))
+    finally:
+        client_socket.close()
+
+
+def legacy_server():
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((stock.HOST, LEGACY_SOCKET_PORT))
+    server_socket.listen(5)
+    while True:
+        client_socket, _ = server_socket.accept()
+        threading.Thread(target=legacy_handle_client, args=(client_socket,), daemon=True).start()
+
+
+def legacy_client(n_requests):
+    for _ in range(n_requests):
+        with socket.create_connection((stock.HOST, LEGACY_SOCKET_PORT)) as sock:
+            sock.sendall(json.dumps(PAYLOAD).encode("utf-8"))
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+            json.loads(b"".join(chunks))
+
+
+# New implementation
+def recv_exactly(sock, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-frame")
+        buf += chunk
+    return buf
+
+
+def async_client(n_requests):
+    with socket.create_connection((stock.HOST, ASYNC_SOCKET_PORT)) as sock:
+        frame = stock.encode_frame(PAYLOAD)
+        for _ in range(n_requests):
+            sock.sendall(frame)
+            (length,) = stock.FRAME_HEADER.unpack(recv_exactly(sock, stock.FRAME_HEADER.size))
+            json.loads(recv_exactly(sock, length))
+
+
+def async_server():
+    asyncio.run(stock.serve_socket(port=ASYNC_SOCKET_PORT, handler=stub_insights))
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((stock.HOST, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Port {port} did not open")
+
+
+def run(client, n_clients, n_requests):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_clients) as executor:
+        list(executor.map(client, [n_requests] * n_clients))
+    elapsed = time.perf_counter() - start
+    return n_clients * n_requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    http = uvicorn.Server(uvicorn.Config(stub_app, host=stock.HOST, port=LEGACY_HTTP_PORT, log_level="warning"))
+    threading.Thread(target=http.run, daemon=True).start()
+    threading.Thread(target=legacy_server, daemon=True).start()
+    threading.Thread(target=async_server, daemon=True).start()
+    for port in (LEGACY_HTTP_PORT, LEGACY_SOCKET_PORT, ASYNC_SOCKET_PORT):
+        wait_for_port(port)
+
+    legacy = run(legacy_client, args.clients, args.requests)
+    framed = run(async_client, args.clients, args.requests)
+    print(f"legacy (thread + loopback HTTP): {legacy:8.1f} req/s")
+    print(f"asyncio (framed, in-process):    {framed:8.1f} req/s")
+    print(f"speedup: {framed / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,23 @@ import sqlite3
 import pandas as pd
 import numpy as np
 import requests
-import nltk
-import socket
+import os
+import asyncio
+import struct
 import json
 import threading
-from nltk.sentiment import SentimentIntensityAnalyzer
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 import google.generativeai as genai
 import uvicorn
+from utils.sentiment import SentimentEngine
 
-# Download necessary NLTK data
-nltk.download('vader_lexicon', quiet=True)
-sia = SentimentIntensityAnalyzer()
+# Shared sentiment engine (set SENTIMENT_MODEL to use a local transformer instead of VADER)
+sentiment_engine = SentimentEngine(transformer_model=os.getenv("SENTIMENT_MODEL"))
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -48,8 +52,8 @@ class AnalysisAgent:
     def __init__(self):
         pass
 
-    def analyze_sentiment(self, news_data):
-        return [{"title": news["title"], "sentiment": sia.polarity_scores(news["title"])["compound"]} for news in news_data]
+    def analyze_sentiment(self, news_data, symbol=None):
+        return sentiment_engine.score_articles(news_data, symbol=symbol)
 
     def detect_trends(self, stock_data):
         df = pd.DataFrame(stock_data).T.astype(float)
@@ -58,28 +62,97 @@ class AnalysisAgent:
         df['trend'] = np.where(df['SMA_10'] > df['SMA_50'], 'Bullish', 'Bearish')
         return df[['4. close', 'SMA_10', 'SMA_50', 'trend']]
 
+def mean_sentiment(sentiment_data):
+    """Average compound score, or None when there are no scored headlines."""
+    return float(np.mean([s['sentiment'] for s in sentiment_data])) if sentiment_data else None
+
 class DecisionAgent:
     def __init__(self):
         pass
 
-    def generate_insight(self, stock_trends, sentiment_data, gdp_data):
+    def generate_insight(self, stock_trends, sentiment_data, gdp_data, avg_sentiment=None):
         last_trend = stock_trends.iloc[-1]['trend']
-        avg_sentiment = np.mean([s['sentiment'] for s in sentiment_data])
+        if avg_sentiment is None:
+            avg_sentiment = mean_sentiment(sentiment_data)
         latest_gdp = float(gdp_data[-1]['value']) if gdp_data else None
-        decision = "Buy" if last_trend == "Bullish" and avg_sentiment > 0 and latest_gdp > 0 else "Sell"
+        positive_sentiment = avg_sentiment is not None and avg_sentiment > 0
+        decision = "Buy" if last_trend == "Bullish" and positive_sentiment and latest_gdp > 0 else "Sell"
         return {"market_trend": last_trend, "sentiment_score": avg_sentiment, "latest_gdp": latest_gdp, "recommendation": decision}
 
-    def generate_gemini_insights(self, stock_trends, sentiment_data, gdp_data):
+    def generate_gemini_insights(self, stock_trends, sentiment_data, gdp_data, avg_sentiment=None):
+        if avg_sentiment is None:
+            avg_sentiment = mean_sentiment(sentiment_data)
         prompt = f"""
         Based on the following market data:
         - Stock Market Trend: {stock_trends.iloc[-1]['trend']}
-        - Sentiment Score: {np.mean([s['sentiment'] for s in sentiment_data])}
+        - Sentiment Score: {avg_sentiment if avg_sentiment is not None else 'Unavailable'}
         - Latest GDP Data: {gdp_data[-1]['value'] if gdp_data else 'Unavailable'}
         Provide an in-depth financial insight and investment strategy.
         """
         response = genai.GenerativeModel("gemini-pro").generate_content(prompt)
         return response.text if response else "No insights available."
 
+    def generate_portfolio_gemini_insights(self, symbol_summaries, gdp_data):
+        """
+        One prompt for many symbols; returns {symbol: commentary}.
+
+        If the reply is blocked or is not a JSON object (e.g. cut off at the output
+        limit), a batch of four or more symbols is split in half and each half is
+        retried once. Symbols still without commentary get "No insights available.",
+        so a batch never costs more calls than it has symbols.
+        """
+        parsed, text = self._request_portfolio_insights(symbol_summaries, gdp_data)
+        if parsed is not None:
+            return {symbol: parsed.get(symbol) or "No insights available." for symbol in symbol_summaries}
+        if len(symbol_summaries) == 1:
+            return {symbol: text or "No insights available." for symbol in symbol_summaries}
+
+        insights = {symbol: "No insights available." for symbol in symbol_summaries}
+        if len(symbol_summaries) < 4:
+            return insights
+        items = list(symbol_summaries.items())
+        half = len(items) // 2
+        for sub_batch in (dict(items[:half]), dict(items[half:])):
+            try:
+                parsed, _ = self._request_portfolio_insights(sub_batch, gdp_data)
+            except Exception as e:
+                insights.update({symbol: f"Error generating insights: {e}" for symbol in sub_batch})
+                continue
+            if parsed is not None:
+                insights.update({symbol: parsed[symbol] for symbol in sub_batch if parsed.get(symbol)})
+        return insights
+
+    def _request_portfolio_insights(self, symbol_summaries, gdp_data):
+        """Returns (parsed JSON object or None, raw reply text)."""
+        def sentiment_text(score):
+            return score if score is not None else 'Unavailable'
+
+        lines = "\n".join(
+            f"        - {symbol}: Trend {summary['market_trend']}, Sentiment Score {sentiment_text(summary['sentiment_score'])}"
+            for symbol, summary in symbol_summaries.items()
+        )
+        prompt = f"""
+        Based on the following market data:
+        - Latest GDP Data: {gdp_data[-1]['value'] if gdp_data else 'Unavailable'}
+        Per-stock data:
+{lines}
+        Provide a concise financial insight and investment strategy for each stock, at most 100 words each.
+        Respond only with a JSON object mapping each stock symbol to its insight text.
+        """
+        response = genai.GenerativeModel("gemini-pro").generate_content(prompt)
+        try:
+            text = response.text if response else ""
+        except ValueError:
+            # Raised when the reply was blocked or has no parts
+            return None, ""
+        try:
+            parsed = json.loads(re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip()))
+        except ValueError:
+            return None, text
+        if not isinstance(parsed, dict) or not parsed:
+            return None, text
+        return parsed, text
+
 # API for Insights
 class StockQuery(BaseModel):
     symbol: str
@@ -89,62 +162,174 @@ class StockQuery(BaseModel):
     fred_api_key: str
     gemini_api_key: str
 
+# Stateless agents are shared across requests
+analysis_agent = AnalysisAgent()
+decision_agent = DecisionAgent()
+
 @app.post("/insights/")
 def get_insights(query: StockQuery):
     data_agent = DataAgent(query.alpha_vantage_key, query.news_api_key, query.fred_api_key)
-    analysis_agent = AnalysisAgent()
-    decision_agent = DecisionAgent()
 
     stock_data = data_agent.fetch_stock_data(query.symbol)
     news_data = data_agent.fetch_news_data(query.news_query)
     economic_data = data_agent.fetch_economic_data()
 
-    sentiment_data = analysis_agent.analyze_sentiment(news_data)
+    sentiment_data = analysis_agent.analyze_sentiment(news_data, symbol=query.symbol)
+    avg_sentiment = mean_sentiment(sentiment_data)
     stock_trends = analysis_agent.detect_trends(stock_data)
-    insights = decision_agent.generate_insight(stock_trends, sentiment_data, economic_data)
-    gemini_insights = decision_agent.generate_gemini_insights(stock_trends, sentiment_data, economic_data)
+    insights = decision_agent.generate_insight(stock_trends, sentiment_data, economic_data, avg_sentiment)
+    insights["rolling_sentiment"] = sentiment_engine.aggregate(query.symbol)
+    gemini_insights = decision_agent.generate_gemini_insights(stock_trends, sentiment_data, economic_data, avg_sentiment)
 
     return {"basic_insights": insights, "advanced_insights": gemini_insights}
 
+# API for Portfolio Insights
+PORTFOLIO_FETCH_WORKERS = 8
+PORTFOLIO_LLM_BATCH_SIZE = 25
+PORTFOLIO_LLM_WORKERS = 2
+
+class PortfolioQuery(BaseModel):
+    symbols: List[str]
+    news_queries: Dict[str, str] = {}
+    alpha_vantage_key: str
+    news_api_key: str
+    fred_api_key: str
+    gemini_api_key: str
+
+@app.post("/portfolio/insights/")
+def get_portfolio_insights(query: PortfolioQuery):
+    data_agent = DataAgent(query.alpha_vantage_key, query.news_api_key, query.fred_api_key)
+    symbols = list(dict.fromkeys(query.symbols))
+
+    # Macro data is the same for every symbol, so fetch it once
+    economic_data = data_agent.fetch_economic_data()
+
+    def fetch(symbol):
+        news_query = query.news_queries.get(symbol, symbol)
+        try:
+            return data_agent.fetch_stock_data(symbol), data_agent.fetch_news_data(news_query)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=PORTFOLIO_FETCH_WORKERS) as executor:
+        fetched = dict(zip(symbols, executor.map(fetch, symbols)))
+
+    # Keep the response in request order so clients can zip it against their input
+    results = dict.fromkeys(symbols)
+    for symbol, data in fetched.items():
+        if isinstance(data, Exception):
+            results[symbol] = {"error": str(data)}
+    fetched = {symbol: data for symbol, data in fetched.items() if not isinstance(data, Exception)}
+
+    # Score every headline in one batched pass; the per-symbol calls below then hit the cache
+    sentiment_engine.score_articles([article for _, news_data in fetched.values() for article in news_data])
+
+    summaries = {}
+    for symbol, (stock_data, news_data) in fetched.items():
+        try:
+            sentiment_data = analysis_agent.analyze_sentiment(news_data, symbol=symbol)
+            avg_sentiment = mean_sentiment(sentiment_data)
+            stock_trends = analysis_agent.detect_trends(stock_data)
+            insights = decision_agent.generate_insight(stock_trends, sentiment_data, economic_data, avg_sentiment)
+        except Exception as e:
+            results[symbol] = {"error": str(e)}
+            continue
+        insights["rolling_sentiment"] = sentiment_engine.aggregate(symbol)
+        results[symbol] = {"basic_insights": insights}
+        summaries[symbol] = insights
+
+    # LLM commentary: one prompt per batch of symbols, with a bounded number of calls in flight
+    batches = [dict(list(summaries.items())[i:i + PORTFOLIO_LLM_BATCH_SIZE])
+               for i in range(0, len(summaries), PORTFOLIO_LLM_BATCH_SIZE)]
+
+    def commentary(batch):
+        try:
+            return decision_agent.generate_portfolio_gemini_insights(batch, economic_data)
+        except Exception as e:
+            return {symbol: f"Error generating insights: {e}" for symbol in batch}
+
+    with ThreadPoolExecutor(max_workers=PORTFOLIO_LLM_WORKERS) as executor:
+        for batch_insights in executor.map(commentary, batches):
+            for symbol, text in batch_insights.items():
+                results[symbol]["advanced_insights"] = text
+
+    return {"latest_gdp": float(economic_data[-1]['value']) if economic_data else None, "symbols": results}
+
 # Socket Server Configuration
 HOST = "127.0.0.1"
 PORT = 8080
+MAX_CONCURRENT_REQUESTS = 8
+MAX_FRAME_SIZE = 10 * 1024 * 1024
+
+# Each message is a 4-byte big-endian length followed by a UTF-8 JSON body.
+FRAME_HEADER = struct.Struct("!I")
+
+def encode_frame(payload):
+    body = json.dumps(jsonable_encoder(payload)).encode("utf-8")
+    return FRAME_HEADER.pack(len(body)) + body
 
-def handle_client(client_socket):
+class FrameTooLarge(Exception):
+    pass
+
+async def read_frame(reader):
+    """Read one frame body as bytes, or return None when the client closes the connection."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise FrameTooLarge(f"Frame of {length} bytes exceeds limit of {MAX_FRAME_SIZE}")
+    return await reader.readexactly(length)
+
+async def handle_client(reader, writer, limiter, handler=None):
+    """Serve framed requests on one persistent connection until the client disconnects."""
+    handler = handler or get_insights
+    addr = writer.get_extra_info("peername")
+    print(f"[SOCKET SERVER] Connection from {addr}")
     try:
-        data = client_socket.recv(4096).decode("utf-8")
-        if not data:
-            return
-        
-        print("[SERVER] Received request:", data)
-        
-        # Convert JSON string to dictionary
-        request_data = json.loads(data)
-        
-        # Call FastAPI endpoint
-        response = requests.post("http://127.0.0.1:8000/insights/", json=request_data)
-        
-        # Send response back to client
-        client_socket.sendall(response.text.encode("utf-8"))
-    
+        while True:
+            try:
+                body = await read_frame(reader)
+            except FrameTooLarge as e:
+                # The oversized body is still in the stream, so the connection can't be resynchronised
+                print(f"[ERROR] {e}")
+                writer.write(encode_frame({"error": str(e)}))
+                await writer.drain()
+                break
+            if body is None:
+                break
+            try:
+                request_data = json.loads(body.decode("utf-8"))
+                async with limiter:
+                    response = await asyncio.to_thread(handler, StockQuery(**request_data))
+            except Exception as e:
+                print(f"[ERROR] {e}")
+                response = {"error": str(e)}
+            writer.write(encode_frame(response))
+            await writer.drain()
     except Exception as e:
         print(f"[ERROR] {e}")
     finally:
-        client_socket.close()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
 
-def start_socket_server():
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((HOST, PORT))
-    server_socket.listen(5)
-    print(f"[SOCKET SERVER] Listening on {HOST}:{PORT}")
+async def serve_socket(host=HOST, port=PORT, max_concurrency=MAX_CONCURRENT_REQUESTS, handler=None):
+    limiter = asyncio.Semaphore(max_concurrency)
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_client(reader, writer, limiter, handler), host, port
+    )
+    print(f"[SOCKET SERVER] Listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
 
-    while True:
-        client_socket, addr = server_socket.accept()
-        print(f"[SOCKET SERVER] Connection from {addr}")
-        client_handler = threading.Thread(target=handle_client, args=(client_socket,))
-        client_handler.start()
+def start_socket_server():
+    asyncio.run(serve_socket())
 
 # Start FastAPI & Socket Server
 if __name__ == "__main__":
     threading.Thread(target=start_socket_server, daemon=True).start()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+
+import nltk
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+nltk.download('vader_lexicon', quiet=True)
+
+
+def article_key(article):
+    """Stable hash for a news article, based on its URL or, failing that, its title."""
+    identity = article.get("url") or article["title"]
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+class VaderScorer:
+    """Scores headlines with NLTK's VADER lexicon (compound score in [-1, 1])."""
+
+    def __init__(self):
+        self.sia = SentimentIntensityAnalyzer()
+
+    def score_batch(self, texts):
+        return [self.sia.polarity_scores(text)["compound"] for text in texts]
+
+
+class TransformerScorer:
+    """Scores headlines with a local Hugging Face model using batched inference."""
+
+    def __init__(self, model_name, batch_size=32):
+        from transformers import pipeline  # optional dependency, only needed for this scorer
+
+        self.batch_size = batch_size
+        self.pipe = pipeline("sentiment-analysis", model=model_name, truncation=True)
+        self.polarity = self._label_polarity(self.pipe.model.config.id2label)
+
+    @staticmethod
+    def _label_polarity(id2label):
+        """Map each model label to +1/-1/0; refuse models whose labels don't name a sentiment."""
+        polarity = {}
+        for label in id2label.values():
+            name = label.lower()
+            if name.startswith("pos"):
+                polarity[label] = 1.0
+            elif name.startswith("neg"):
+                polarity[label] = -1.0
+            elif name.startswith("neu"):
+                polarity[label] = 0.0
+            else:
+                raise ValueError(f"Unrecognised sentiment label '{label}' (expected positive/negative/neutral)")
+        return polarity
+
+    def score_batch(self, texts):
+        results = self.pipe(list(texts), batch_size=self.batch_size)
+        return [self.polarity[result["label"]] * result["score"] for result in results]
+
+
+class SentimentEngine:
+    """
+    Cached, batched headline sentiment scoring.
+
+    Articles without a title are skipped and the rest are deduplicated by URL/title
+    hash. Scores are kept in an LRU cache so repeated NewsAPI results are never
+    rescored, and only unseen headlines are sent to the scorer in batches. If the
+    transformer model fails on a batch, that batch is scored with VADER instead.
+    A rolling window of scores is kept per symbol.
+    """
+
+    def __init__(self, transformer_model=None, batch_size=32, cache_size=10000, window=200):
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.window = window
+        self.scorer = self._load_scorer(transformer_model)
+        self._fallback = None
+        self._cache = OrderedDict()
+        self._rolling = {}
+        self._lock = threading.Lock()
+
+    def _load_scorer(self, transformer_model):
+        if transformer_model:
+            try:
+                return TransformerScorer(transformer_model, batch_size=self.batch_size)
+            except Exception as e:
+                logging.warning(f"Could not load transformer model '{transformer_model}', falling back to VADER: {e}")
+        return VaderScorer()
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _cache_put_many(self, items):
+        with self._lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _score_batch(self, texts):
+        try:
+            return self.scorer.score_batch(texts)
+        except Exception as e:
+            if isinstance(self.scorer, VaderScorer):
+                raise
+            logging.warning(f"Transformer scoring failed, scoring batch with VADER: {e}")
+            if self._fallback is None:
+                self._fallback = VaderScorer()
+            return self._fallback.score_batch(texts)
+
+    def _score_uncached(self, pending):
+        """Score {key: title} in batches of batch_size."""
+        keys = list(pending)
+        scored = []
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i + self.batch_size]
+            scored.extend(zip(batch, self._score_batch([pending[k] for k in batch])))
+
+        self._cache_put_many(scored)
+        return dict(scored)
+
+    def score_articles(self, articles, symbol=None):
+        """Return [{"title", "sentiment"}] for each unique article, updating the symbol's rolling window."""
+        unique = OrderedDict()
+        for article in articles:
+            if not article.get("title"):
+                continue
+            key = article_key(article)
+            if key not in unique:
+                unique[key] = article["title"]
+
+        scores = {}
+        pending = {}
+        for key, title in unique.items():
+            cached = self._cache_get(key)
+            if cached is None:
+                pending[key] = title
+            else:
+                scores[key] = cached
+
+        if pending:
+            scores.update(self._score_uncached(pending))
+
+        if symbol:
+            self._update_rolling(symbol, [(key, scores[key]) for key in unique])
+
+        return [{"title": title, "sentiment": scores[key]} for key, title in unique.items()]
+
+    def _update_rolling(self, symbol, scored):
+        with self._lock:
+            state = self._rolling.setdefault(symbol, {"scores": deque(), "keys": set(), "total": 0.0})
+            for key, score in scored:
+                if key in state["keys"]:
+                    continue
+                state["scores"].append((key, score))
+                state["keys"].add(key)
+                state["total"] += score
+                if len(state["scores"]) > self.window:
+                    old_key, old_score = state["scores"].popleft()
+                    state["keys"].discard(old_key)
+                    state["total"] -= old_score
+
+    def aggregate(self, symbol):
+        """Rolling mean sentiment and article count for a symbol."""
+        with self._lock:
+            state = self._rolling.get(symbol)
+            if not state or not state["scores"]:
+                return {"mean": None, "count": 0}
+            count = len(state["scores"])
+            return {"mean": state["total"] / count, "count": count}
@@ -1,6 +1,12 @@
 import google.generativeai as genai
+from google.api_core import exceptions
 from pdf2image import convert_from_path
 import os
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unstructured.partition.pdf import partition_pdf
 import logging
 # Configure logging
@@ -22,7 +28,11 @@ def extract_text_with_unstructured(pdf_path):
         logging.info("🔍 Starting text extraction with Unstructured...")
         print("🔍 Extracting text...")  # Debug message
 
-        elements = partition_pdf(pdf_path)  # This might be blocking execution
+        # "fast" reads the embedded text layer and skips layout/OCR models, which dominate runtime
+        elements = partition_pdf(pdf_path, strategy="fast")
+        if not any(str(element).strip() for element in elements):
+            logging.info("No text layer found, falling back to full layout extraction...")
+            elements = partition_pdf(pdf_path)
         text = "\n\n".join([str(element) for element in elements])
 
         logging.info(f"✅ Extracted text (first 1000 chars): {text[:1000]}")  # Debug preview
@@ -33,24 +43,267 @@ def extract_text_with_unstructured(pdf_path):
         return "Error extracting text."
 
 
+# Summarization engine settings
+SUMMARY_MODEL = "gemini-1.5-pro-latest"
+CHUNK_CHARS = 30000  # About 7-8k tokens: well inside the model's context, small enough to keep detail
+MIN_SECTION_CHARS = 500  # Sections with less body text than this are merged into the previous one
+REDUCE_FAN_IN = 6  # Average number of partial summaries combined per reduce step
+MAX_CONCURRENT_CALLS = 4
+REQUESTS_PER_MINUTE = 30
+MAX_RETRIES = 6
+MAX_RETRY_DELAY = 60  # Seconds; long enough to wait out a per-minute quota window
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summary_cache")
+
+CHUNK_PROMPT = "Summarize this section of a financial report. Keep all key figures, metrics and risks:\n\n"
+REDUCE_PROMPT = "Combine these partial summaries of a financial report into one structured summary. Keep all key figures, metrics and risks:\n\n"
+SUMMARY_SEPARATOR = "\n\n---\n\n"
+
+
+LABELLED_HEADING = re.compile(r"^(note|part|item|section|schedule|article)\s+(\d{1,3}[a-z]?|[ivxlc]+)\b[.:]?(?P<rest>.*)$", re.I)
+NUMBERED_HEADING = re.compile(r"^(\d{1,2}\.(\d{1,2}\.?)*|[ivx]+\.)\s+(?P<rest>[a-z].*)$", re.I)
+TRAILING_FIGURES = re.compile(r"\d[\d,.%)]*$")
+
+
+def is_heading(paragraph):
+    """
+    Heuristic for section titles: a short single line that is either labelled
+    ("Note 12", "Part II", "Item 1A. Risk Factors", "SECTION 3"), numbered
+    ("1. Revenue", "2.3 Risks", "IV. Outlook") or written in capitals. Lines whose
+    text ends in figures are table rows, not headings.
+    """
+    line = paragraph.strip()
+    if not line or "\n" in line or len(line) > 80:
+        return False
+    match = LABELLED_HEADING.match(line) or NUMBERED_HEADING.match(line)
+    if match:
+        # Only the text after the label must not look like a table row or a sentence
+        rest = match.group("rest").strip()
+        return not rest or not (rest[-1] in ".,;:" or TRAILING_FIGURES.search(rest))
+    if line[-1] in ".,;:" or TRAILING_FIGURES.search(line):
+        return False
+    return sum(c.isalpha() for c in line) >= 4 and line.isupper()
+
+
+def is_anchor(text, modulus):
+    """Content-defined boundary: true for roughly 1 in `modulus` texts, always the same for the same text."""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16) % modulus == 0
+
+
+def split_into_sections(text):
+    """Split text into sections at headings, merging sections too short to stand alone."""
+    sections = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if is_heading(paragraph) and sections:
+            previous = sections[-1]
+            body_chars = sum(len(p) for p in previous[1:]) if is_heading(previous[0]) else MIN_SECTION_CHARS
+            if body_chars >= MIN_SECTION_CHARS:
+                sections.append([paragraph])
+                continue
+        if sections:
+            sections[-1].append(paragraph)
+        else:
+            sections.append([paragraph])
+    return ["\n\n".join(section) for section in sections]
+
+
+def split_into_chunks(text, max_chars=CHUNK_CHARS):
+    """
+    Split text into section-aware chunks of at most max_chars, grouped by section.
+
+    Returns a list of groups, each a list of chunks. A section longer than
+    max_chars becomes its own group of several chunks; consecutive short
+    sections are packed together into single-chunk groups. Packs also close at
+    content-defined section boundaries, so an edit in one section only changes
+    the chunks (and cached summaries) near it.
+    """
+    groups = []
+    pack = ""
+    for section in split_into_sections(text):
+        if len(section) > max_chars:
+            if pack:
+                groups.append([pack])
+                pack = ""
+            chunks = []
+            chunk = ""
+            for paragraph in section.split("\n\n"):
+                # Hard-split paragraphs that are too long on their own
+                for piece in [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)]:
+                    if chunk and len(chunk) + len(piece) + 2 > max_chars:
+                        chunks.append(chunk)
+                        chunk = ""
+                    chunk = f"{chunk}\n\n{piece}" if chunk else piece
+            if chunk:
+                chunks.append(chunk)
+            groups.append(chunks)
+            continue
+
+        if pack and len(pack) + len(section) + 2 > max_chars:
+            groups.append([pack])
+            pack = ""
+        pack = f"{pack}\n\n{section}" if pack else section
+        if is_anchor(section, 4):
+            groups.append([pack])
+            pack = ""
+    if pack:
+        groups.append([pack])
+    return groups
+
+
+def group_summaries(summaries, fan_in=REDUCE_FAN_IN):
+    """
+    Group partial summaries for one reduce step using content-defined boundaries.
+
+    A group ends after a summary whose hash is an anchor (or at 2 * fan_in), so
+    inserting or changing one summary only regroups its neighbours instead of
+    shifting every later group. Every group except possibly the last has at
+    least two members, so each step makes progress.
+    """
+    groups = [[]]
+    for summary in summaries:
+        group = groups[-1]
+        group.append(summary)
+        if len(group) >= 2 * fan_in or (len(group) >= 2 and is_anchor(summary, fan_in)):
+            groups.append([])
+    return [group for group in groups if group]
+
+
+class RateLimiter:
+    """Caps concurrent calls and spaces their start times to stay under a per-minute quota."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_CALLS, per_minute=REQUESTS_PER_MINUTE):
+        self.slots = threading.Semaphore(max_concurrent)
+        self.interval = 60.0 / per_minute
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def __enter__(self):
+        self.slots.acquire()
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self.slots.release()
+
+
+class SummaryCache:
+    """On-disk cache of summaries keyed by a hash of the prompt and input text."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(prompt, text):
+        return hashlib.sha256(f"{SUMMARY_MODEL}\0{prompt}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        path = os.path.join(self.cache_dir, f"{key}.txt")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        return None
+
+    def put(self, key, summary):
+        path = os.path.join(self.cache_dir, f"{key}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(summary)
+
+
+class SummarizationEngine:
+    """Hierarchical map-reduce summarization with per-chunk caching and a shared rate limit."""
+
+    def __init__(self, cache=None, limiter=None, chunk_chars=CHUNK_CHARS, fan_in=REDUCE_FAN_IN):
+        self.cache = cache or SummaryCache()
+        self.limiter = limiter or RateLimiter()
+        self.chunk_chars = chunk_chars
+        self.fan_in = fan_in
+        self.model = genai.GenerativeModel(SUMMARY_MODEL)
+
+    def call_gemini(self, prompt, text):
+        """Summarize one piece of text, reusing the cached result when the input is unchanged."""
+        key = self.cache.key(prompt, text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.debug(f"Cache hit for chunk {key[:12]}")
+            return cached
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                with self.limiter:
+                    response = self.model.generate_content(prompt + text)
+                break
+            except exceptions.ResourceExhausted:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                delay = min(MAX_RETRY_DELAY, max(self.limiter.interval, 1) * 2 ** attempt)
+                logging.warning(f"Gemini API rate limit exceeded, retrying in {delay:.0f}s...")
+                time.sleep(delay)
+
+        try:
+            summary = response.text if response else ""
+        except ValueError as e:
+            # Raised when the candidate was blocked or has no parts; skip this piece rather than the document
+            logging.warning(f"No summary returned for chunk {key[:12]}: {e}")
+            return ""
+        if summary:
+            self.cache.put(key, summary)
+        return summary
+
+    def summarize_all(self, prompt, texts):
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS) as executor:
+            return list(executor.map(lambda text: self.call_gemini(prompt, text), texts))
+
+    def reduce(self, summary_lists):
+        """Reduce each list of partial summaries to one, running every list's reduce calls for a level together."""
+        level = 1
+        while any(len(summaries) > 1 for summaries in summary_lists):
+            grouped = [group_summaries(summaries, self.fan_in) for summaries in summary_lists]
+            pending = [SUMMARY_SEPARATOR.join(group) for groups in grouped for group in groups if len(group) > 1]
+            logging.info(f"Reduce level {level}: {len(pending)} calls")
+            # A blocked reduce call keeps its inputs rather than dropping them
+            combined = iter(summary or text for summary, text in zip(self.summarize_all(REDUCE_PROMPT, pending), pending))
+            summary_lists = [[next(combined) if len(group) > 1 else group[0] for group in groups] for groups in grouped]
+            level += 1
+        return [summaries[0] for summaries in summary_lists if summaries]
+
+    def summarize(self, text):
+        groups = split_into_chunks(text, self.chunk_chars)
+        chunks = [chunk for group in groups for chunk in group]
+        if not chunks:
+            return ""
+        logging.info(f"Summarizing {len(chunks)} chunks in {len(groups)} sections...")
+        partials = iter(self.summarize_all(CHUNK_PROMPT, chunks))
+        per_section = [[summary for summary in (next(partials) for _ in group) if summary] for group in groups]
+
+        # Reduce within each section first, then across sections
+        section_summaries = self.reduce(per_section)
+        if not section_summaries:
+            return ""
+        return self.reduce([section_summaries])[0]
+
+
 def generate_summary_with_gemini(text):
-    """Generate a structured financial summary using Google Gemini API."""
+    """Generate a structured financial summary of the full document using Google Gemini API."""
     try:
-        logging.info("Sending request to Gemini API for summarization...")
-
-        # Limit input text to avoid exceeding API limits
-        truncated_text = text[:4000]  # Gemini API handles around 4000 chars well
-        model = genai.GenerativeModel("gemini-1.5-pro-latest")
-        response = model.generate_content(f"Summarize this financial report:\n\n{truncated_text}")
+        logging.info("Sending requests to Gemini API for summarization...")
+        summary = SummarizationEngine().summarize(text)
 
-        if response and hasattr(response, "text"):
+        if summary:
             logging.info("Received response from Gemini API.")
-            return response.text
+            return summary
         else:
             logging.error("No summary generated.")
             return "No summary generated."
 
-    except genai.types.RateLimitError:
+    except exceptions.ResourceExhausted:
         logging.error("Gemini API rate limit exceeded. Try again later.")
         return "API Error: Rate limit exceeded."
     